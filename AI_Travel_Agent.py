@@ -1,50 +1,290 @@
-import gradio as gr
-import json
+import asyncio
+import functools
+import hashlib
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 import re
-import requests
-import feedparser
-from datetime import datetime
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
+import httpx
+import diskcache
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+from datetime import datetime, timezone
+
+# Patterns compiled once at import instead of on every request
+ATTRACTION_RE = re.compile(r"(?:1\.|2\.|3\.|\-)\s*([A-Z][\w ,'&\-]+)")
+# Day labels may be markdown-decorated ("**Day 3**:", "### Day 3 -"); trip-total cost lines are skipped
+ITINERARY_RE = re.compile(
+    r"^[#*\- \t]*Day\s+(?P<day>\d+)\b|(?<![Tt]otal )Estimated cost[^\n]*?[\u20B9\$](?P<cost>\d+)",
+    re.M
+)
+JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(\[.*?\])\s*```", re.S)
+
+# --- LLM Response Cache ---
+
+# Responses are kept in memory per process and on disk across restarts
+LLM_CACHE_DIR = "./.llm_cache"
+HOTEL_CACHE_TTL = 24 * 60 * 60
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60
+
+MEMORY_CACHE_SIZE = 256
+_memory_cache = OrderedDict()
+
+# Opened on first use so importing the module doesn't create the cache directory
+@functools.lru_cache(maxsize=None)
+def get_llm_cache():
+    return diskcache.Cache(LLM_CACHE_DIR)
+
+def cache_key(name, *args):
+    return hashlib.sha256("|".join(map(str, (name, *args))).encode()).hexdigest()
+
+def _remember(key, value, expire_time):
+    if key not in _memory_cache and len(_memory_cache) >= MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+    _memory_cache[key] = (value, expire_time)
+    _memory_cache.move_to_end(key)
+
+def _disk_get(key):
+    return get_llm_cache().get(key, expire_time=True)
+
+def _disk_set(key, value, expire):
+    get_llm_cache().set(key, value, expire=expire)
+
+# Blocking disk I/O and feed parsing run here so they never stall the event loop
+io_executor = ThreadPoolExecutor(max_workers=4)
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+async def cache_get(key):
+    hit = _memory_cache.get(key)
+    if hit:
+        if hit[1] is None or hit[1] > time.time():
+            _memory_cache.move_to_end(key)
+            return hit[0]
+        del _memory_cache[key]
+    value, expire_time = await run_blocking(_disk_get, key)
+    if value is not None:
+        _remember(key, value, expire_time)
+    return value
+
+async def cache_set(key, value, expire=None):
+    await run_blocking(_disk_set, key, value, expire)
+    _remember(key, value, time.time() + expire if expire else None)
+
+def cached(expire=None):
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args):
+            key = cache_key(fn.__name__, *args)
+            result = await cache_get(key)
+            if result is None:
+                result = await fn(*args)
+                await cache_set(key, result, expire)
+            return result
+        return wrapper
+    return decorator
+
+# --- Event Loop Scoped Clients ---
+
+# Async clients are bound to the event loop that first uses them, so each running loop gets its own
+def per_event_loop(factory):
+    instances = weakref.WeakKeyDictionary()
+
+    @functools.wraps(factory)
+    def get():
+        loop = asyncio.get_running_loop()
+        if loop not in instances:
+            instances[loop] = factory()
+        return instances[loop]
+    return get
+
+# --- Retries and Concurrency Limits ---
+
+# Caps in-flight LLM requests so parallel planner runs don't burst past provider rate limits
+@per_event_loop
+def get_llm_semaphore():
+    return asyncio.Semaphore(8)
+
+# The provider SDKs wrap HTTP failures in their own exception types, imported lazily like the models
+@functools.lru_cache(maxsize=None)
+def _provider_transient_errors():
+    errors = []
+    try:
+        import groq
+        errors += [groq.APITimeoutError, groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError]
+    except ImportError:
+        pass
+    try:
+        from google.api_core import exceptions as google_exceptions
+        errors += [
+            google_exceptions.TooManyRequests,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.InternalServerError,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.GatewayTimeout,
+            google_exceptions.DeadlineExceeded
+        ]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+def is_transient_error(exc):
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, TimeoutError, *_provider_transient_errors()))
+
+retry_transient = retry(
+    wait=wait_random_exponential(min=1, max=8),
+    stop=stop_after_attempt(4),
+    retry=retry_if_exception(is_transient_error),
+    reraise=True
+)
+
+# Only opening the stream is retried; once a chunk has reached the caller it can't be replayed
+@retry_transient
+async def open_stream(llm, prompt_text):
+    stream = llm.astream(prompt_text)
+    try:
+        return stream, await stream.__anext__()
+    except StopAsyncIteration:
+        return stream, None
+
+# Yields the response text accumulated so far as tokens arrive
+async def stream_llm(llm, prompt_text):
+    async with get_llm_semaphore():
+        stream, chunk = await open_stream(llm, prompt_text)
+        if chunk is None:
+            return
+        text = chunk.content
+        yield text
+        async for chunk in stream:
+            text += chunk.content
+            yield text
 
 # --- Existing Travel Functions ---
 
-# LLM model for attractions, restaurants, transportation
-model = ChatGoogleGenerativeAI(model="gemini-1.5-flash")
+# Pooled HTTP/2 client so Groq requests reuse TCP/TLS connections
+@per_event_loop
+def get_llm_http_client():
+    return httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(retries=2, http2=True),
+        timeout=30
+    )
+
+# LangChain is imported on first use so library callers don't pay for it at import time
+@per_event_loop
+def _get_models():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_groq import ChatGroq
 
-travel_prompt = PromptTemplate.from_template("""
+    # LLM model for attractions, restaurants, transportation
+    model = ChatGoogleGenerativeAI(model="gemini-1.5-flash")
+    # LLM model for itinerary generation
+    itinerary_model = ChatGroq(
+        model_name="deepseek-r1-distill-llama-70b",
+        temperature=0.7,
+        http_async_client=get_llm_http_client()
+    )
+    return model, itinerary_model
+
+travel_prompt = """
 You are a travel assistant. Given the following city name, list the top 3 tourist attractions, activity, adventure sports and a short description of each.
 For each of the following tourist landmarks in {city}, list 2 top-rated restaurants (preferably 5-star Google-rated or highly rated) nearby. For each restaurant, include the name, cuisine type, and a one-line description.
 For each of the following tourist landmarks in {city}, suggest transportation and estimated cast for public transsport and cab's cast.
 
 City: {city}
-""")
+"""
+
+def extract_attractions(full_response):
+    stripped = (s for s in (a.strip() for a in ATTRACTION_RE.findall(full_response)) if len(s) > 3)
+    attractions = list(dict.fromkeys(stripped))
+    return attractions[:3]
 
-def travel_guide(city):
+# Yields the travel guide text accumulated so far as tokens arrive
+async def stream_travel_guide(city):
+    key = cache_key("stream_travel_guide", city)
+    full_response = await cache_get(key)
+    if full_response is not None:
+        yield full_response
+        return
     prompt_text = travel_prompt.format(city=city)
-    full_response = model.invoke(prompt_text).content
-    attraction_pattern = re.findall(r"(?:1\\.|2\\.|3\\.|\\-)\\s*([A-Z][\\w\\s,'&\\-]+)", full_response)
-    attractions = list(dict.fromkeys([a.strip() for a in attraction_pattern if len(a.strip()) > 3]))
-    return {
-        "city": city,
-        "attractions": attractions[:3],
-        "full_guide": full_response
-    }
+    model, _ = _get_models()
+    full_response = ""
+    async for full_response in stream_llm(model, prompt_text):
+        yield full_response
+    await cache_set(key, full_response)
+
+# Shared HTTP client so repeated forecasts reuse pooled HTTP/2 connections
+@per_event_loop
+def get_http_client():
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=10.0,
+        headers={"User-Agent": "CalamityForecast/1.0 (your@email.com)"}
+    )
+
+# GDACS feed is reused for a few minutes, then revalidated with a conditional GET
+GDACS_URL = "https://www.gdacs.org/xml/rss.xml"
+GDACS_CACHE_TTL = 300
+_gdacs_cache = {"etag": None, "modified": None, "feed": None, "fetched_at": 0.0}
+
+@retry_transient
+async def fetch_gdacs_feed():
+    cached_feed = _gdacs_cache["feed"]
+    if cached_feed is not None and time.time() - _gdacs_cache["fetched_at"] < GDACS_CACHE_TTL:
+        return cached_feed
+    headers = {}
+    if _gdacs_cache["etag"]:
+        headers["If-None-Match"] = _gdacs_cache["etag"]
+    if _gdacs_cache["modified"]:
+        headers["If-Modified-Since"] = _gdacs_cache["modified"]
+    response = await get_http_client().get(GDACS_URL, headers=headers)
+    if response.status_code == 304 and cached_feed is not None:
+        feed = cached_feed
+    else:
+        response.raise_for_status()
+        import feedparser
+        feed = await run_blocking(feedparser.parse, response.content)
+        _gdacs_cache.update(
+            etag=response.headers.get("ETag"),
+            modified=response.headers.get("Last-Modified"),
+            feed=feed
+        )
+    _gdacs_cache["fetched_at"] = time.time()
+    return feed
 
-def calamity_forecast(city, start_date, end_date):
+@retry_transient
+async def http_get(url, params):
+    response = await get_http_client().get(url, params=params)
+    response.raise_for_status()
+    return response
+
+# City coordinates are effectively static, and Nominatim's usage policy asks clients to cache them
+@cached(expire=GEOCODE_CACHE_TTL)
+async def geocode(city):
     geo_url = "https://nominatim.openstreetmap.org/search"
     geo_params = {"q": city, "format": "json"}
-    headers = {"User-Agent": "CalamityForecast/1.0 (your@email.com)"}
-    geo_response = requests.get(geo_url, params=geo_params, headers=headers)
+    geo_response = await http_get(geo_url, geo_params)
+    geo_data = orjson.loads(geo_response.content)
+    if not geo_data:
+        return None
+    return float(geo_data[0]["lat"]), float(geo_data[0]["lon"])
+
+async def calamity_forecast(city, start_date, end_date, landmarks=()):
+    # One alternation matches the city and any landmarks in a single scan per entry.
+    # Empty names are skipped since an empty branch would match every entry; (?!) never matches
+    names = [name for name in (city, *landmarks) if name]
+    location_re = re.compile("|".join(map(re.escape, names)) or "(?!)", re.I)
     try:
-        geo_data = geo_response.json()
+        coordinates = await geocode(city.casefold())
     except Exception:
         return {"error": "Failed to parse geolocation response. Possibly blocked or invalid."}
-    if not geo_data:
+    if coordinates is None:
         return {"error": f"Location '{city}' not found."}
-    lat = float(geo_data[0]["lat"])
-    lon = float(geo_data[0]["lon"])
+    lat, lon = coordinates
 
     weather_url = "https://api.open-meteo.com/v1/forecast"
     weather_params = {
@@ -55,12 +295,6 @@ def calamity_forecast(city, start_date, end_date):
         "start_date": start_date,
         "end_date": end_date
     }
-    weather_response = requests.get(weather_url, params=weather_params)
-    try:
-        weather_data = weather_response.json().get("daily", {})
-    except Exception:
-        weather_data = "Weather API failed or returned invalid data"
-
     usgs_url = "https://earthquake.usgs.gov/fdsnws/event/1/query"
     usgs_params = {
         "format": "geojson",
@@ -68,27 +302,40 @@ def calamity_forecast(city, start_date, end_date):
         "endtime": end_date,
         "minmagnitude": 4.5
     }
-    usgs_response = requests.get(usgs_url, params=usgs_params)
+    # Weather, USGS and GDACS are independent of each other, so fetch them together
+    weather_response, usgs_response, gdacs_feed = await asyncio.gather(
+        http_get(weather_url, weather_params),
+        http_get(usgs_url, usgs_params),
+        fetch_gdacs_feed(),
+        return_exceptions=True
+    )
+
+    try:
+        weather_data = orjson.loads(weather_response.content).get("daily", {})
+    except Exception:
+        weather_data = "Weather API failed or returned invalid data"
+
     earthquakes = []
     try:
-        usgs_data = usgs_response.json()
+        usgs_data = orjson.loads(usgs_response.content)
         for eq in usgs_data.get("features", []):
             place_info = eq["properties"]["place"]
-            if city.lower() in place_info.lower():
+            if location_re.search(place_info):
                 earthquakes.append({
                     "place": place_info,
                     "magnitude": eq["properties"]["mag"],
-                    "time": datetime.utcfromtimestamp(eq["properties"]["time"] / 1000).strftime('%Y-%m-%d %H:%M:%S'),
+                    "time": datetime.fromtimestamp(eq["properties"]["time"] / 1000, tz=timezone.utc).isoformat(sep=' ', timespec='seconds'),
                     "url": eq["properties"]["url"]
                 })
     except Exception:
         earthquakes = "USGS data unavailable or failed to decode"
 
     try:
-        gdacs_feed = feedparser.parse("https://www.gdacs.org/xml/rss.xml")
+        if isinstance(gdacs_feed, Exception):
+            raise gdacs_feed
         gdacs_alerts = []
         for entry in gdacs_feed.entries:
-            if city.lower() in entry.title.lower() or city.lower() in entry.summary.lower():
+            if location_re.search(entry.title) or location_re.search(entry.summary):
                 gdacs_alerts.append({
                     "event": entry.title,
                     "details": entry.summary,
@@ -102,7 +349,7 @@ def calamity_forecast(city, start_date, end_date):
     return (city, lat, lon, weather_data, gdacs_alerts)
 
 # Hotel Recommender
-prompt = PromptTemplate.from_template("""
+prompt = """
 You are a travel assistant. Suggest 5 top-rated hotels in {city}.
 
 - 2 should be premium luxury hotels (7-star or 5-star),
@@ -123,20 +370,19 @@ Format the output as a JSON list like this:
   }},
   ...
 ]
-""")
+"""
 
-def hotel_recommender(city: str):
+@cached(expire=HOTEL_CACHE_TTL)
+@retry_transient
+async def hotel_recommender(city: str):
     input_text = prompt.format(city=city)
-    response = model.invoke(input_text).content
+    model, _ = _get_models()
+    async with get_llm_semaphore():
+        response = (await model.ainvoke(input_text)).content
     return response
 
 # Itinerary Generator
-itinerary_model = ChatGroq(
-    model_name="deepseek-r1-distill-llama-70b",
-    temperature=0.7
-)
-
-itinerary_prompt = PromptTemplate.from_template("""
+itinerary_prompt = """
 You are a professional travel planner. Create a detailed itinerary for a trip to {city} for {days} days.
 
 Must include:
@@ -155,40 +401,66 @@ Day 1:
 - Afternoon: ...
 - Evening: ...
 - Estimated cost: ₹XXXX
-""")
+"""
 
-def generate_itinerary(city: str, days: int, attractions: list[str], adventure_sports: list[str]):
+def format_itinerary_prompt(city, days, attractions, adventure_sports):
     attractions_str = ", ".join(attractions)
     adventure_str = ", ".join(adventure_sports)
-    input_prompt = itinerary_prompt.format(
+    return itinerary_prompt.format(
         city=city,
         days=days,
         attractions=attractions_str,
         adventure_sports=adventure_str
     )
-    itinerary = itinerary_model.invoke(input_prompt).content
-    return itinerary
+
+# Yields the itinerary text accumulated so far as tokens arrive
+async def stream_itinerary(city: str, days: int, attractions: list[str], adventure_sports: list[str]):
+    key = cache_key("stream_itinerary", city, days, attractions, adventure_sports)
+    itinerary = await cache_get(key)
+    if itinerary is not None:
+        yield itinerary
+        return
+    input_prompt = format_itinerary_prompt(city, days, attractions, adventure_sports)
+    _, itinerary_model = _get_models()
+    itinerary = ""
+    async for itinerary in stream_llm(itinerary_model, input_prompt):
+        yield itinerary
+    await cache_set(key, itinerary)
 
 # --- Total Cost Calculation ---
+
+# Day labels and their costs come out of one pass over the itinerary text
+def scan_itinerary(itinerary_text):
+    daily_costs = {}
+    day = None
+    for match in ITINERARY_RE.finditer(itinerary_text):
+        if match.group("day"):
+            day = int(match.group("day"))
+            daily_costs.setdefault(day, 0)
+        else:
+            daily_costs[day] = daily_costs.get(day, 0) + int(match.group("cost"))
+    return daily_costs
+
 def calculate_total_cost(itinerary_text):
-    cost_lines = [line for line in itinerary_text.splitlines() if "Estimated cost" in line]
-    total_cost = 0
-    for line in cost_lines:
-        match = re.search(r"[\u20B9\$](\d+)", line)
-        if match:
-            total_cost += int(match.group(1))
-    return total_cost
+    return sum(scan_itinerary(itinerary_text).values())
 
 # --- Trip Summary Generation ---
-def generate_summary(city, days, attractions, hotel_info, total_cost):
+
+# Models often wrap the hotel list in a markdown fence or surrounding prose
+def extract_json(text):
+    match = JSON_FENCE_RE.search(text)
+    return match.group(1) if match else text[text.find('['):text.rfind(']') + 1]
+
+def generate_summary(city, days, attractions, hotel_info, total_cost, daily_costs=None):
     try:
-        hotel_info = hotel_info.strip()
-        if not hotel_info.startswith('['):
-            raise ValueError("Hotel info is not in JSON format")
-        hotel_data = json.loads(hotel_info)
+        hotel_data = orjson.loads(extract_json(hotel_info))
         top_hotel = hotel_data[0]['name'] if hotel_data else "N/A"
     except Exception:
         top_hotel = "Hotel data unavailable"
+    # Costs seen before any day label are listed as unassigned so the breakdown adds up to the total
+    daily_breakdown = ", ".join(
+        f"{'Unassigned' if day is None else f'Day {day}'}: ₹{cost}" for day, cost in (daily_costs or {}).items()
+    ) or "N/A"
 
     summary = f"""
 Trip Summary:
@@ -197,40 +469,82 @@ Duration: {days} days
 Top Attractions: {', '.join(attractions)}
 Recommended Hotel: {top_hotel}
 Estimated Total Trip Cost: ₹{total_cost}
+Daily Costs: {daily_breakdown}
 """
     return summary.strip()
 
 # --- Main Function for Integration ---
-def main_travel_planner(city, days):
-    guide = travel_guide(city)
-    attractions = guide['attractions']
+async def main_travel_planner(city, days):
     adventure_sports = ["Paragliding", "Jet Skiing"]
-    itinerary = generate_itinerary(city, days, attractions, adventure_sports)
-    hotel_data = hotel_recommender(city)
-    total_cost = calculate_total_cost(itinerary)
-    summary = generate_summary(city, days, attractions, hotel_data, total_cost)
-    return guide['full_guide'], itinerary, hotel_data, f"₹{total_cost}", summary
+    # Hotels only need the city, so fetch them while the guide streams
+    hotel_task = asyncio.create_task(hotel_recommender(city))
+    texts = {"guide": "", "itinerary": ""}
+    updates = asyncio.Queue()
+
+    async def pump(name, stream):
+        try:
+            async for text in stream:
+                texts[name] = text
+                updates.put_nowait((name, False))
+        except Exception as exc:
+            updates.put_nowait((name, exc))
+        else:
+            updates.put_nowait((name, True))
+
+    streams = [asyncio.create_task(pump("guide", stream_travel_guide(city)))]
+    attractions = None
+    pending = 1
+    try:
+        while pending:
+            name, status = await updates.get()
+            if isinstance(status, Exception):
+                raise status
+            if status:
+                pending -= 1
+            # Start the itinerary as soon as the attractions are known, while the guide keeps streaming
+            if attractions is None and name == "guide":
+                guide = texts["guide"]
+                # Only whole lines are scanned so a half-streamed name is never picked up
+                found = extract_attractions(guide if status else guide[:guide.rfind("\n") + 1])
+                if status or len(found) == 3:
+                    attractions = found
+                    itinerary_stream = stream_itinerary(city, days, attractions, adventure_sports)
+                    streams.append(asyncio.create_task(pump("itinerary", itinerary_stream)))
+                    pending += 1
+            hotel_data = hotel_task.result() if hotel_task.done() else ""
+            yield texts["guide"], texts["itinerary"], hotel_data, "", ""
+        hotel_data = await hotel_task
+    finally:
+        for task in (hotel_task, *streams):
+            task.cancel()
+    itinerary = texts["itinerary"]
+    daily_costs = scan_itinerary(itinerary)
+    total_cost = sum(daily_costs.values())
+    summary = generate_summary(city, days, attractions, hotel_data, total_cost, daily_costs)
+    yield texts["guide"], itinerary, hotel_data, f"₹{total_cost}", summary
 
 # --- Gradio UI ---
-def gradio_interface(city, days):
-    return main_travel_planner(city, int(days))
-
-iface = gr.Interface(
-    fn=gradio_interface,
-    inputs=[
-        gr.Textbox(label="City Name"),
-        gr.Number(label="Number of Days", precision=0)
-    ],
-    outputs=[
-        gr.Textbox(label="Travel Guide"),
-        gr.Textbox(label="Itinerary"),
-        gr.Textbox(label="Hotel Recommendations"),
-        gr.Textbox(label="Estimated Total Cost"),
-        gr.Textbox(label="Trip Summary")
-    ],
-    title="AI Travel Planner",
-    description="Plan your trip with hotel, itinerary, attractions, activities and costs."
-)
+async def gradio_interface(city, days):
+    async for outputs in main_travel_planner(city, int(days)):
+        yield outputs
 
 if __name__ == "__main__":
+    import gradio as gr
+
+    iface = gr.Interface(
+        fn=gradio_interface,
+        inputs=[
+            gr.Textbox(label="City Name"),
+            gr.Number(label="Number of Days", precision=0)
+        ],
+        outputs=[
+            gr.Textbox(label="Travel Guide"),
+            gr.Textbox(label="Itinerary"),
+            gr.Textbox(label="Hotel Recommendations"),
+            gr.Textbox(label="Estimated Total Cost"),
+            gr.Textbox(label="Trip Summary")
+        ],
+        title="AI Travel Planner",
+        description="Plan your trip with hotel, itinerary, attractions, activities and costs."
+    )
     iface.launch()